@@ -2,6 +2,7 @@
 Configuration for Hanzi → Pinyin → LaTeX conversion.
 """
 
+import os
 import re
 from pathlib import Path
 
@@ -13,6 +14,20 @@ from pypinyin import Style
 # Base directory of this package (used for locating LaTeX templates)
 BASE_DIR: Path = Path(__file__).resolve().parent
 
+# Per-user cache directory (holds the precompiled preamble, see `build_format`)
+CACHE_DIR: Path = (
+    Path(
+        os.environ.get("LOCALAPPDATA")
+        or os.environ.get("XDG_CACHE_HOME")
+        or Path.home() / ".cache"
+    )
+    / "chinese2pdf"
+)
+
+# Whether to precompile the preamble with `mylatexformat` and reuse it
+# (experimental, not yet validated against a TeX Live install)
+PRECOMPILE_PREAMBLE: bool = False
+
 # ---------------------------------------------------------------------
 # Fonts
 # ---------------------------------------------------------------------
@@ -55,11 +70,18 @@ DIACRITIC_TO_TONE: dict[str, str] = {
 # ---------------------------------------------------------------------
 # Punctuation
 # ---------------------------------------------------------------------
-# Regex for opening punctuation (binds forward)
-PUNCT_OPEN_PATTERN = re.compile(r"^[“‘（《〈【『「〖〔［｛]+$")
+# Opening punctuation (binds forward)
+PUNCT_OPEN_CHARS: str = "“‘（《〈【『「〖〔［｛"
+
+# Closing punctuation (binds backward)
+PUNCT_CLOSE_CHARS: str = "，。？！：；、”’）》〉】』」〗〕］｝…—"
 
-# Regex for closing punctuation (binds backward)
-PUNCT_CLOSE_PATTERN = re.compile(r"^[，。？！：；、”’）》〉】』」〗〕］｝…—]+$")
+# Derived from the characters above: regexes match whole tokens, the set is
+# for single-character membership tests
+PUNCT_OPEN_PATTERN = re.compile(f"^[{re.escape(PUNCT_OPEN_CHARS)}]+$")
+PUNCT_CLOSE_PATTERN = re.compile(f"^[{re.escape(PUNCT_CLOSE_CHARS)}]+$")
+PUNCT_ANY_PATTERN = re.compile(f"^[{re.escape(PUNCT_OPEN_CHARS + PUNCT_CLOSE_CHARS)}]+$")
+PUNCT_ANY_SET = frozenset(PUNCT_OPEN_CHARS + PUNCT_CLOSE_CHARS)
 
 # ---------------------------------------------------------------------
 # Punctuation
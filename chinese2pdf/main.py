@@ -5,6 +5,7 @@ Command-line interface for Chinese → PDF generator.
 import argparse
 from pathlib import Path
 
+import jieba
 import pandas as pd
 from pdf_generator import generate_pdf
 
@@ -68,6 +69,20 @@ def parse_args() -> argparse.Namespace:
     return parser.parse_args()
 
 
+def load_hsk_csv(path: Path) -> pd.DataFrame:
+    """
+    Load an HSK CSV dataset.
+
+    Uses the faster PyArrow parser when `pyarrow` is installed, and the default
+    parser otherwise. Both produce the same (NumPy-backed) dtypes.
+    """
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return pd.read_csv(path)
+    return pd.read_csv(path, engine="pyarrow")
+
+
 def main() -> None:
     """
     Entry point for the command-line tool.
@@ -77,11 +92,15 @@ def main() -> None:
     - Saves the result to the specified output path.
     """
     args = parse_args()
+
+    # Load jieba's dictionary up front rather than on the first segmentation
+    jieba.initialize()
+
     text = args.input.read_text(encoding="utf-8")
 
     hsk_df = pd.DataFrame()
     if args.hsk_csv:
-        hsk_df = pd.read_csv(args.hsk_csv)
+        hsk_df = load_hsk_csv(args.hsk_csv)
         if args.annotate_hsk:
             hsk_df = hsk_df[hsk_df["level"].isin(args.annotate_hsk)]
 
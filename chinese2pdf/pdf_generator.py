@@ -3,35 +3,142 @@ Takes Chinese text, converts it into Hanzi, Pinyin, and ruby-annotated
 representations, and compiles them into a formatted PDF using XeLaTeX.
 """
 
+import hashlib
+import os
+import re
 import shutil
 import subprocess
 import tempfile
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import chain
 from pathlib import Path
+from typing import Any, Dict, Iterable, List
 
 import pandas as pd
-from config import BASE_DIR, CJK_MAIN_FONT
+from config import BASE_DIR, CACHE_DIR, CJK_MAIN_FONT, PRECOMPILE_PREAMBLE
 from text_formatter import (
-    render_hanzi,
+    build_hsk_map,
+    cut_mixed_batch,
     parse_paragraphs,
-    pinyin_only,
+    render_all,
     vocabulary,
 )
 
+# Template placeholders, e.g. <<TITLE>>
+PLACEHOLDER_PATTERN = re.compile(r"<<(\w+)>>")
 
-def generate_pdf(
+
+@lru_cache(maxsize=1)
+def xelatex_version() -> str | None:
+    """Return the `xelatex --version` banner, or None if XeLaTeX is unavailable."""
+    try:
+        result = subprocess.run(
+            ["xelatex", "--version"], capture_output=True, text=True, check=True
+        )
+    except (subprocess.CalledProcessError, OSError):
+        return None
+    return result.stdout
+
+
+def format_cache_path() -> Path | None:
+    """
+    Return the cache path of the precompiled preamble.
+
+    The file name is keyed on the XeLaTeX version and the template contents, so
+    a TeX upgrade or a template edit never reuses an incompatible format.
+    Returns None if XeLaTeX is unavailable.
+    """
+    version = xelatex_version()
+    if version is None:
+        return None
+    template = (BASE_DIR / "latex_template.tex").read_bytes()
+    key = hashlib.sha256(version.encode("utf-8") + template).hexdigest()[:16]
+    return CACHE_DIR / f"chinese2pdf-{key}.fmt"
+
+
+def discard_format(fmt_path: Path) -> None:
+    """Delete a format and record it as failed, so it is not rebuilt."""
+    marker = fmt_path.with_suffix(".failed")
+    try:
+        fmt_path.unlink(missing_ok=True)
+        marker.touch()
+    except OSError:
+        pass
+    warnings.warn(
+        "Could not precompile the LaTeX preamble; compiling without it. "
+        f"Delete {marker} to try again (e.g. after installing mylatexformat).",
+        stacklevel=2,
+    )
+
+
+def build_format(force: bool = False) -> Path | None:
+    """
+    Precompile the LaTeX template preamble into a XeLaTeX format file.
+
+    Uses the `mylatexformat` package to dump everything before
+    ``\\endofdump`` in the template. The format is cached in `CACHE_DIR` (see
+    `format_cache_path`). A failed build is recorded next to it and not retried for
+    the same XeLaTeX version and template.
+
+    Parameters
+    ----------
+    force : bool, optional
+        Rebuild the format even if one exists or a build failed before
+        (default: False).
+
+    Returns
+    -------
+    Path | None
+        Path to the format file, or None if it could not be built (e.g. the
+        `mylatexformat` package is missing or `CACHE_DIR` is not writable).
+    """
+    fmt_path = format_cache_path()
+    if fmt_path is None:
+        return None
+    if not force:
+        if fmt_path.exists():
+            return fmt_path
+        if fmt_path.with_suffix(".failed").exists():
+            return None
+
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        # Build inside CACHE_DIR so the finished format is renamed into place
+        # atomically: concurrent runs never see a partially written file.
+        with tempfile.TemporaryDirectory(dir=CACHE_DIR) as tmpdir:
+            subprocess.run(
+                [
+                    "xelatex",
+                    "-ini",
+                    "-interaction=batchmode",
+                    f"-jobname={fmt_path.stem}",
+                    f"-output-directory={tmpdir}",
+                    "&xelatex",
+                    "mylatexformat.ltx",
+                    "latex_template.tex",
+                ],
+                cwd=BASE_DIR,
+                check=True,
+                stdout=subprocess.DEVNULL,
+            )
+            os.replace(Path(tmpdir) / fmt_path.name, fmt_path)
+    except (subprocess.CalledProcessError, OSError):
+        discard_format(fmt_path)
+        return None
+
+    fmt_path.with_suffix(".failed").unlink(missing_ok=True)
+    return fmt_path
+
+
+def render_document(
     text: str,
     title: str = "Chinese Text",
-    filename: str | Path = "output.pdf",
-    cleanup: bool = True,
-    hsk_df: pd.DataFrame = pd.DataFrame(),
-) -> None:
+    hsk_map: Dict[str, Dict[str, Any]] | None = None,
+) -> str:
     """
-    Generate a PDF from Chinese text using LaTeX (via XeLaTeX).
-
-    Produces a professionally typeset document containing:
-      - Hanzi-only view
-      - Pinyin-only view
-      - Hanzi with ruby Pinyin annotations
+    Fill the LaTeX template with the rendered views of a Chinese text.
 
     Parameters
     ----------
@@ -39,33 +146,75 @@ def generate_pdf(
         Input Chinese text (UTF-8).
     title : str, optional
         Title for the PDF (default: "Chinese Text").
+    hsk_map : dict, optional
+        HSK index from `build_hsk_map`; no annotations if omitted.
+
+    Returns
+    -------
+    str
+        Complete LaTeX source of the document.
+    """
+    hsk_map = hsk_map or {}
+
+    # Split and segment paragraphs once, shared by every section
+    paragraphs = parse_paragraphs(text)
+    paragraph_tokens = cut_mixed_batch(paragraphs)
+
+    # Render all three views in a single pass
+    hanzi_section, ruby_section, pinyin_section = render_all(
+        paragraphs, hsk_map=hsk_map, paragraph_tokens=paragraph_tokens
+    )
+
+    vocabulary_section = vocabulary(
+        text, hsk_map=hsk_map, tokens=chain.from_iterable(paragraph_tokens)
+    )
+
+    # Load LaTeX template and inject content in a single pass
+    template_path = BASE_DIR / "latex_template.tex"
+    template = template_path.read_text(encoding="utf-8")
+    if not vocabulary_section:
+        template = template.replace("\\section*{Vocabulary}\n\\LatinSize\n<<VOCABULARY>>", "")
+
+    substitutions = {
+        "FONT": CJK_MAIN_FONT,
+        "TITLE": title,
+        "HANZI": hanzi_section,
+        "RUBY": ruby_section,
+        "PINYIN": pinyin_section,
+        "VOCABULARY": vocabulary_section,
+    }
+    return PLACEHOLDER_PATTERN.sub(lambda m: substitutions[m.group(1)], template)
+
+
+def compile_tex(
+    filled: str,
+    filename: str | Path = "output.pdf",
+    cleanup: bool = True,
+    format_path: Path | None = None,
+    quiet: bool = False,
+) -> None:
+    """
+    Compile LaTeX source into a PDF with XeLaTeX.
+
+    Parameters
+    ----------
+    filled : str
+        Complete LaTeX source, e.g. from `render_document`.
     filename : str | Path, optional
         Output PDF filename (default: "output.pdf").
     cleanup : bool, optional
         If True (default), intermediate .aux/.log/.tex files are deleted.
         If False, they are copied alongside the final PDF.
+    format_path : Path | None, optional
+        Precompiled preamble from `build_format` to preload, if any.
+    quiet : bool, optional
+        If True, XeLaTeX output is not printed; on failure the .log file is
+        copied to the output directory instead (default: False).
     """
     filename = Path(filename).resolve()
     out_dir = filename.parent
     out_dir.mkdir(parents=True, exist_ok=True)
 
-    # Load LaTeX template and inject content
-    template_path = BASE_DIR / "latex_template.tex"
-    filled = (
-        template_path.read_text(encoding="utf-8")
-        .replace("<<FONT>>", CJK_MAIN_FONT)
-        .replace("<<TITLE>>", title)
-        .replace("<<HANZI>>", render_hanzi(parse_paragraphs(text), hsk_df, with_ruby=False))
-        .replace("<<RUBY>>", render_hanzi(parse_paragraphs(text), hsk_df, with_ruby=True))
-        .replace("<<PINYIN>>", pinyin_only(parse_paragraphs(text)))
-    )
-
-    vocabulary_section = vocabulary(text, hsk_df)
-    if vocabulary_section:
-        filled = filled.replace("<<VOCABULARY>>", vocabulary_section)
-    else:
-        filled = filled.replace("\\section*{Vocabulary}\n\\LatinSize\n<<VOCABULARY>>", "")
-
     jobname = filename.stem
 
     with tempfile.TemporaryDirectory() as tmpdir:
@@ -74,18 +223,30 @@ def generate_pdf(
         tex_file = tmpdir / f"{jobname}.tex"
         tex_file.write_text(filled, encoding="utf-8")
 
-        # Run XeLaTeX
-        try:
+        def run_xelatex(format_args: List[str]) -> None:
             subprocess.run(
                 [
                     "xelatex",
                     "-interaction=nonstopmode",
+                    *format_args,
                     f"-jobname={jobname}",
                     f"-output-directory={tmpdir}",
                     str(tex_file),
                 ],
                 check=True,
+                stdout=subprocess.DEVNULL if quiet else None,
             )
+
+        # Run XeLaTeX, preloading the precompiled preamble when available
+        try:
+            try:
+                run_xelatex([f"-fmt={format_path}"] if format_path else [])
+            except subprocess.CalledProcessError:
+                if not format_path:
+                    raise
+                # Retry without the format; if that works, the format is at fault
+                run_xelatex([])
+                discard_format(format_path)
         except subprocess.CalledProcessError as e:
             # Copy auxiliary files for debugging
             for ext in (".aux", ".log", ".tex"):
@@ -93,7 +254,8 @@ def generate_pdf(
                 if produced_file.exists():
                     shutil.copy(produced_file, out_dir / produced_file.name)
 
-            raise RuntimeError("XeLaTeX failed, see log above.") from e
+            log_hint = out_dir / f"{jobname}.log" if quiet else "log above"
+            raise RuntimeError(f"XeLaTeX failed, see {log_hint}.") from e
 
         # Move the final PDF into the requested location
         produced_pdf = tmpdir / f"{jobname}.pdf"
@@ -108,3 +270,127 @@ def generate_pdf(
                 produced_file = tmpdir / f"{jobname}{ext}"
                 if produced_file.exists():
                     shutil.copy(produced_file, out_dir / produced_file.name)
+
+
+def generate_pdf(
+    text: str,
+    title: str = "Chinese Text",
+    filename: str | Path = "output.pdf",
+    cleanup: bool = True,
+    hsk_df: pd.DataFrame = pd.DataFrame(),
+) -> None:
+    """
+    Generate a PDF from Chinese text using LaTeX (via XeLaTeX).
+
+    Produces a professionally typeset document containing:
+      - Hanzi-only view
+      - Pinyin-only view
+      - Hanzi with ruby Pinyin annotations
+
+    Parameters
+    ----------
+    text : str
+        Input Chinese text (UTF-8).
+    title : str, optional
+        Title for the PDF (default: "Chinese Text").
+    filename : str | Path, optional
+        Output PDF filename (default: "output.pdf").
+    cleanup : bool, optional
+        If True (default), intermediate .aux/.log/.tex files are deleted.
+        If False, they are copied alongside the final PDF.
+    """
+    filled = render_document(text, title, hsk_map=build_hsk_map(hsk_df))
+    format_path = build_format() if PRECOMPILE_PREAMBLE else None
+    compile_tex(filled, filename, cleanup=cleanup, format_path=format_path)
+
+
+class PdfBuilder:
+    """
+    Reusable PDF generator for batches of documents.
+
+    The HSK index and the precompiled preamble are prepared once and shared by
+    every document. Texts are rendered one after the other, while the XeLaTeX
+    runs (the dominant cost) execute concurrently.
+
+    Parameters
+    ----------
+    hsk_df : pd.DataFrame, optional
+        HSK dataset used for annotations (default: none).
+    cleanup : bool, optional
+        If True (default), intermediate .aux/.log/.tex files are deleted.
+    max_workers : int | None, optional
+        Maximum number of concurrent XeLaTeX processes (default: CPU count).
+    """
+
+    def __init__(
+        self,
+        hsk_df: pd.DataFrame = pd.DataFrame(),
+        cleanup: bool = True,
+        max_workers: int | None = None,
+    ) -> None:
+        self.hsk_map = build_hsk_map(hsk_df)
+        self.cleanup = cleanup
+        self.max_workers = max_workers or os.cpu_count()
+        self.format_path = build_format() if PRECOMPILE_PREAMBLE else None
+
+    def build(
+        self,
+        text: str,
+        title: str = "Chinese Text",
+        filename: str | Path = "output.pdf",
+    ) -> None:
+        """Generate a single PDF, see `generate_pdf`."""
+        filled = render_document(text, title, hsk_map=self.hsk_map)
+        compile_tex(filled, filename, cleanup=self.cleanup, format_path=self.format_path)
+
+    def build_many(
+        self,
+        texts: Iterable[str],
+        filenames: Iterable[str | Path],
+        titles: Iterable[str] | None = None,
+    ) -> None:
+        """
+        Generate one PDF per text.
+
+        XeLaTeX output is not printed, since concurrent runs would interleave.
+        Every document is attempted; if any fail, a single error lists them
+        all and the .log of each failed document is kept in its output directory.
+
+        Parameters
+        ----------
+        texts : Iterable[str]
+            Input Chinese texts (UTF-8).
+        filenames : Iterable[str | Path]
+            Output PDF filename for each text.
+        titles : Iterable[str] | None, optional
+            Title for each PDF (default: "Chinese Text" for all).
+        """
+        texts = list(texts)
+        filenames = list(filenames)
+        titles = list(titles) if titles is not None else ["Chinese Text"] * len(texts)
+        if not len(texts) == len(filenames) == len(titles):
+            raise ValueError("texts, filenames and titles must have the same length.")
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [
+                executor.submit(
+                    compile_tex,
+                    render_document(text, title, hsk_map=self.hsk_map),
+                    filename,
+                    self.cleanup,
+                    self.format_path,
+                    quiet=True,
+                )
+                for text, title, filename in zip(texts, titles, filenames)
+            ]
+            failures = []
+            for filename, future in zip(filenames, futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    failures.append(f"{filename}: {e}")
+
+        if failures:
+            raise RuntimeError(
+                f"{len(failures)} of {len(futures)} PDFs failed:\n" + "\n".join(failures)
+            )
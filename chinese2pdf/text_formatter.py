@@ -4,14 +4,18 @@ Hanzi, Pinyin, and ruby-annotated representations.
 """
 
 from collections import defaultdict
-from typing import Any, Dict, Iterable, List, Set
+from functools import lru_cache, partial
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
 
 import jieba
+import numpy as np
 import pandas as pd
 from config import (
     DIACRITIC_TO_TONE,
     HANZI_RUN,
     HSK_LEVEL_COLORS,
+    PUNCT_ANY_PATTERN,
+    PUNCT_ANY_SET,
     PUNCT_CLOSE_PATTERN,
     PUNCT_OPEN_PATTERN,
     TONE_COLORS,
@@ -19,6 +23,35 @@ from config import (
 )
 from pypinyin import Style, pinyin
 
+# Non-Hanzi separator used to segment many Hanzi runs in a single jieba call
+RUN_SEPARATOR = "\x00"
+
+# Opening of each HSK level's vocabulary longtable (column spec, headers, footers)
+VOCABULARY_TABLE_HEADER = "\n".join(
+    [
+        "\\begin{longtable}{cccc p{0.5\\linewidth}}",
+        # --- header for first page
+        "\\hline",
+        "\\textbf{Hanzi} & \\textbf{Pinyin} & \\textbf{POS}"
+        " & \\textbf{Audio} & \\textbf{English}\\\\",
+        "\\hline",
+        "\\endfirsthead",
+        # --- header for continuation pages
+        "\\hline",
+        "\\textbf{Hanzi} & \\textbf{Pinyin} & \\textbf{POS}"
+        " & \\textbf{Audio} & \\textbf{English}\\\\",
+        "\\hline",
+        "\\endhead",
+        # --- footer on non-final pages
+        "\\hline",
+        "\\multicolumn{5}{r}{\\footnotesize Continued on next page}\\\\",
+        "\\endfoot",
+        # --- footer on last page
+        "\\hline",
+        "\\endlastfoot",
+    ]
+)
+
 
 # ---------------------------------------------------------------------
 # Paragraph & Token Helpers
@@ -53,53 +86,76 @@ def is_hanzi_word(token: str) -> bool:
     return all(is_hanzi(c) for c in token)
 
 
-def cut_mixed(s: str) -> List[str]:
+def split_punct(s: str, tokens: List[str]) -> None:
+    """Append a non-Hanzi span to `tokens`, splitting out punctuation as single tokens."""
+    buf_start = 0
+    for j, ch in enumerate(s):
+        if ch in PUNCT_ANY_SET:
+            # flush any buffered non-punct chars before this punctuation
+            if j > buf_start:
+                tokens.append(s[buf_start:j])
+            # add the punctuation itself as a separate token
+            tokens.append(ch)
+            buf_start = j + 1
+
+    # flush remaining non-punct chars in this non-Hanzi span
+    if len(s) > buf_start:
+        tokens.append(s[buf_start:])
+
+
+def cut_mixed(
+    s: str, cut_run: Optional[Callable[[str], List[str]]] = None
+) -> List[str]:
     """Segment a mixed Chinese/Latin string into tokens.
-    - Hanzi runs -> jieba.lcut (HMM=False)
+    - Hanzi runs -> jieba.lcut (HMM=False), or `cut_run` if given
     - Latin/digits/etc. -> grouped
     - Punctuation -> separate tokens
     """
+    if cut_run is None:
+        cut_run = partial(jieba.lcut, HMM=False)
+
     tokens: List[str] = []
     i = 0
-    n = len(s)
-
-    while i < n:
-        # Case 1: Hanzi run
-        m = HANZI_RUN.match(s, i)
-        if m:
-            han = m.group(0)
-            tokens.extend(jieba.lcut(han, HMM=False))
-            i = m.end()
-            continue
 
-        # Case 2: Non-Hanzi segment; split out open/close punctuation as single tokens
-        j = i
-        buf_start = j
-        while j < n and not HANZI_RUN.match(s, j):
-            ch = s[j]
-            if PUNCT_OPEN_PATTERN.match(ch) or PUNCT_CLOSE_PATTERN.match(ch):
-                # flush any buffered non-punct chars before this punctuation
-                if j > buf_start:
-                    tokens.append(s[buf_start:j])
-                # add the punctuation itself as a separate token
-                tokens.append(ch)
-                j += 1
-                buf_start = j
-            else:
-                j += 1
-
-        # flush remaining non-punct chars in this non-Hanzi span
-        if j > buf_start:
-            tokens.append(s[buf_start:j])
+    for m in HANZI_RUN.finditer(s):
+        # Non-Hanzi gap before this run
+        if m.start() > i:
+            split_punct(s[i : m.start()], tokens)
+        # Hanzi run
+        tokens.extend(cut_run(m.group(0)))
+        i = m.end()
 
-        i = j
+    # Trailing non-Hanzi gap
+    if i < len(s):
+        split_punct(s[i:], tokens)
 
     return tokens
 
 
+def cut_mixed_batch(texts: Iterable[str]) -> List[List[str]]:
+    """Segment many strings like `cut_mixed`, with a single jieba call.
+
+    All Hanzi runs are joined with `RUN_SEPARATOR`, segmented at once, and the
+    resulting words are handed back to each run in order.
+    """
+    texts = list(texts)
+    runs = [m.group(0) for s in texts for m in HANZI_RUN.finditer(s)]
+
+    run_words: List[List[str]] = [[]]
+    for word in jieba.lcut(RUN_SEPARATOR.join(runs), HMM=False):
+        if word == RUN_SEPARATOR:
+            run_words.append([])
+        else:
+            run_words[-1].append(word)
+
+    next_run = iter(run_words)
+    return [cut_mixed(s, cut_run=lambda _run: next(next_run)) for s in texts]
+
+
 # ---------------------------------------------------------------------
 # Tone Helpers
 # ---------------------------------------------------------------------
+@lru_cache(maxsize=4096)
 def detect_tone(syl: str) -> str:
     """
     Return tone number (1 - 5) from a Pinyin syllable.
@@ -111,11 +167,13 @@ def detect_tone(syl: str) -> str:
     if syl and syl[-1].isdigit():
         return syl[-1]
     for ch in syl:
-        if ch in DIACRITIC_TO_TONE:
-            return DIACRITIC_TO_TONE[ch]
+        tone = DIACRITIC_TO_TONE.get(ch)
+        if tone:
+            return tone
     return "5"
 
 
+@lru_cache(maxsize=4096)
 def colorize_pinyin(syl: str) -> str:
     """Return LaTeX macro with syllable colored according to its tone."""
     tone = detect_tone(syl)
@@ -135,44 +193,56 @@ def build_hsk_map(hsk_df: pd.DataFrame) -> Dict[str, Dict[str, Any]]:
 
     pinyin_column = "pinyin_tone" if TONE_STYLE == Style.TONE else "pinyin_num"
 
-    df = hsk_df.dropna(subset=["hanzi"]).copy()
-
-    hsk_map: Dict[str, Dict[str, Any]] = {}
-    for _, row in df.iterrows():
-        if not row["hanzi"]:
-            continue
+    df = hsk_df.dropna(subset=["hanzi"])
+    df = df[df["hanzi"] != ""]
+
+    # Display columns, assembled column-wise
+    pinyin_raw = df[pinyin_column].fillna("")
+    pinyin_display = pinyin_raw.str.replace(r"\s+", "", regex=True)
+    syllables = pinyin_raw.str.split()
+    pos_display = df["pos"].fillna("")
+    english_display = df["english"].fillna("").str.capitalize()
+    level_display = pd.Series(
+        np.where(df["level"].notna(), "HSK " + df["level"].astype(str), ""),
+        index=df.index,
+    )
+    audio_display = pd.Series(
+        np.where(
+            df["tts_url"].notna() & (df["tts_url"] != ""),
+            "\\href{" + df["tts_url"].astype(str) + "}{\\faVolumeUp}",
+            "",
+        ),
+        index=df.index,
+    )
 
-        # Pinyin
-        pinyin_raw = row[pinyin_column]
-        syllables = pinyin_raw.split()
-        pinyin_display = "".join(syllables)
-        pinyin_display_colorized = "".join(colorize_pinyin(s) for s in syllables)
-
-        # Other fields
-        english_display = row["english"].capitalize()
-        pos_display = row["pos"]
-        level_display = f"HSK {row['level']}" if row["level"] else ""
-        audio_display = (
-            f"\\href{{{row["tts_url"]}}}{{\\faVolumeUp}}" if row["tts_url"] else ""
-        )
-
-        # Toolttip
-        tip: List[str] = ",\t ".join(
-            str(x)
-            for x in (level_display, pinyin_display, pos_display, english_display)
-            if x
-        )
+    # Toolttip: non-empty fields joined by ",\t "
+    tip = pd.Series("", index=df.index)
+    for field in (level_display, pinyin_display, pos_display, english_display):
+        field = field.astype(str)
+        sep = np.where((tip != "") & (field != ""), ",\t ", "")
+        tip = tip + sep + field
 
+    hsk_map: Dict[str, Dict[str, Any]] = {}
+    for hanzi, level, level_str, syls, pos_str, english_str, audio, tip_str in zip(
+        df["hanzi"].tolist(),
+        df["level"].tolist(),
+        level_display.tolist(),
+        syllables.tolist(),
+        pos_display.tolist(),
+        english_display.tolist(),
+        audio_display.tolist(),
+        tip.tolist(),
+    ):
         # Store
         # TODO: Better handle duplicates
-        hsk_map[row["hanzi"]] = {
-            "level": row["level"],
-            "level_display": level_display,
-            "pinyin": pinyin_display_colorized,
-            "pos": pos_display,
-            "english": english_display,
-            "audio": audio_display,
-            "tip": tip,
+        hsk_map[hanzi] = {
+            "level": level,
+            "level_display": level_str,
+            "pinyin": "".join(colorize_pinyin(s) for s in syls if s),
+            "pos": pos_str,
+            "english": english_str,
+            "audio": audio,
+            "tip": tip_str,
         }
 
     return hsk_map
@@ -196,71 +266,117 @@ def tooltip(visible: str, tip: str) -> str:
 # ---------------------------------------------------------------------
 # Rendering Functions
 # ---------------------------------------------------------------------
-def render_hanzi(
-    paragraphs: Iterable[str],
-    hsk_df: pd.DataFrame = pd.DataFrame(),
-    with_ruby: bool = False,
-) -> str:
+def hsk_annotator(hsk_map: Dict[str, Dict[str, Any]]) -> Callable[[str], str]:
     """
-    Render paragraphs as LaTeX with HSK tooltips and optional ruby Pinyin.
+    Return a function wrapping a Hanzi token in HSK highlights and tooltips.
 
     - Whole-word annotation when available; otherwise per-character.
-    - Opening punctuation binds forward; closing punctuation binds backward.
-    - Inserts zero-width glue after each Hanzi chunk to allow wrapping without
-      inserting visible characters.
+    - Without HSK data, tokens are returned unchanged without any lookup.
     """
-    hsk_map = build_hsk_map(hsk_df)
+    if not hsk_map:
+
+        def keep_token(token: str) -> str:
+            return token
+
+        return keep_token
+
+    # Bound once: a single local lookup per token/character in the hot loop
+    lookup = hsk_map.get
 
     def annotate_token(token: str) -> str:
         # Whole word if known; else character-by-character.
-        if token in hsk_map:
-            level = hsk_map[token]["level"]
-            color = HSK_LEVEL_COLORS[level]
+        entry = lookup(token)
+        if entry is not None:
+            color = HSK_LEVEL_COLORS[entry["level"]]
             visible = highlight(token, color)
-            tip = hsk_map[token]["tip"]
-            return tooltip(visible, tip)
+            return tooltip(visible, entry["tip"])
         chars: List[str] = []
         for ch in token:
-            if ch in hsk_map:
-                level = hsk_map[ch]["level"]
-                color = HSK_LEVEL_COLORS[level]
+            entry = lookup(ch)
+            if entry is not None:
+                color = HSK_LEVEL_COLORS[entry["level"]]
                 vis = highlight(ch, color)
-                tip = hsk_map[ch]["tip"]
-                chars.append(tooltip(vis, tip))
+                chars.append(tooltip(vis, entry["tip"]))
             else:
                 chars.append(ch)
 
         return "".join(chars)
 
-    out: List[str] = []
-    for para in paragraphs:
-        pieces: List[str] = []
+    return annotate_token
 
-        for token in cut_mixed(para):
-            if is_hanzi_word(token):
-                word = annotate_token(token)
 
-                if with_ruby:
-                    # Compute tone-colored Pinyin only when needed.
-                    pys = pinyin(token, style=TONE_STYLE, strict=False, errors="ignore")
-                    syls = "".join(colorize_pinyin(s[0]) for s in pys)
-                    word = f"\\ruby{{{word}}}{{{syls}}}"
-                else:
-                    # Avoids breaking word
-                    word = f"\\ruby{{{word}}}{{}}"
+def colorize_token(token: str) -> str:
+    """Return the tone-colored Pinyin syllables of a Hanzi token."""
+    pys = pinyin(token, style=TONE_STYLE, strict=False, errors="ignore")
+    return "".join(colorize_pinyin(s[0]) for s in pys)
 
-                pieces.append(word)
 
-            else:
-                # Latin/number/punctuation/etc.
-                if PUNCT_OPEN_PATTERN.match(token) or PUNCT_CLOSE_PATTERN.match(token):
-                    pieces.append(token)
-                else:
-                    pieces.append(f"\\ruby{{{token}}}{{}}")
+def render_hanzi(
+    paragraphs: Iterable[str],
+    hsk_df: pd.DataFrame = pd.DataFrame(),
+    with_ruby: bool = False,
+    hsk_map: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> str:
+    """
+    Render paragraphs as LaTeX with HSK tooltips and optional ruby Pinyin.
+
+    - Whole-word annotation when available; otherwise per-character.
+    - Opening punctuation binds forward; closing punctuation binds backward.
+    - Inserts zero-width glue after each Hanzi chunk to allow wrapping without
+      inserting visible characters.
+    - A precomputed `hsk_map` (see `build_hsk_map`) takes precedence over `hsk_df`.
+
+    Returns one of the views produced by `render_all`.
+    """
+    hanzi_view, ruby_view, _ = render_all(paragraphs, hsk_df, hsk_map)
+    return ruby_view if with_ruby else hanzi_view
+
 
-        out.append("".join(pieces))
+def pinyin_paragraph(tokens: List[str], words: List[str]) -> str:
+    """
+    Join one segmented paragraph into a colorized Pinyin LaTeX string.
+
+    `words[i]` is the rendered form of `tokens[i]`: colorized Pinyin for Hanzi
+    tokens, the token itself otherwise.
+    """
+
+    def next_is_punct(i: int, tokens: List[str], n_tokens: int) -> bool:
+        """Return True if the token after index `i` is any punctuation (open or close).
+
+        `cut_mixed` emits punctuation as single-character tokens, so set
+        membership is enough here.
+        """
+        return i + 1 < n_tokens and tokens[i + 1] in PUNCT_ANY_SET
 
-    return "\n\n".join(out)
+    n_tokens = len(tokens)
+    # Pieces are only joined once at the end, so punctuation is "attached" by
+    # emitting it next to its word rather than concatenating strings.
+    pieces: List[str] = []
+    pending_open: List[str] = []
+
+    for i, (token, word) in enumerate(zip(tokens, words)):
+        if PUNCT_OPEN_PATTERN.match(token):
+            # opening punct attaches to next token
+            pending_open.append(token)
+
+        elif PUNCT_CLOSE_PATTERN.match(token):
+            # closing punct attaches to previous token
+            pieces.append(token)
+            # no \pywordsep if the next token is punctuation
+            if i != n_tokens - 1 and not next_is_punct(i, tokens, n_tokens):
+                pieces.append("\\pywordsep{}")
+
+        else:  # Hanzi (as Pinyin) / Latin/number/etc.
+            if pending_open:
+                pieces.extend(pending_open)
+                pending_open.clear()
+            pieces.append(word)
+            if not (next_is_punct(i, tokens, n_tokens) or i == n_tokens - 1):
+                pieces.append("\\pywordsep{}")
+
+    pieces.extend(pending_open)
+
+    return "".join(pieces)
 
 
 def pinyin_only(paragraphs: Iterable[str]) -> str:
@@ -271,73 +387,96 @@ def pinyin_only(paragraphs: Iterable[str]) -> str:
     - Opening punctuation binds forward, closing punctuation backward.
     - Non-Hanzi (Latin, numbers, etc.) kept as-is.
     - Words separated by ``\\pywordsep``, except before punctuation or end of line.
+
+    Returns the Pinyin view produced by `render_all`.
     """
+    return render_all(paragraphs)[2]
 
-    def next_is_punct(i: int, tokens: List[str], n_tokens: int) -> bool:
-        """Return True if the token after index `i` is any punctuation (open or close)."""
-        return i + 1 < n_tokens and (
-            PUNCT_CLOSE_PATTERN.match(tokens[i + 1])
-            or PUNCT_OPEN_PATTERN.match(tokens[i + 1])
-        )
-
-    out: List[str] = []
-    for para in paragraphs:
-        tokens = cut_mixed(para)
-        n_tokens = len(tokens)
-        pieces: List[str] = []
-        pending_open = ""
-
-        for i, token in enumerate(tokens):
+
+def render_all(
+    paragraphs: Iterable[str],
+    hsk_df: pd.DataFrame = pd.DataFrame(),
+    hsk_map: Optional[Dict[str, Dict[str, Any]]] = None,
+    paragraph_tokens: Optional[List[List[str]]] = None,
+) -> Tuple[str, str, str]:
+    """
+    Render the Hanzi-only, Hanzi + ruby and Pinyin-only views in one pass.
+
+    Each paragraph is segmented once and each Hanzi token is annotated and
+    converted to Pinyin once. `render_hanzi` and `pinyin_only` return single
+    views of this result.
+
+    Paragraphs already segmented with `cut_mixed_batch` can be passed as
+    `paragraph_tokens`, in which case `paragraphs` is not segmented again.
+    """
+    if paragraph_tokens is None:
+        paragraph_tokens = cut_mixed_batch(paragraphs)
+    if hsk_map is None:
+        hsk_map = build_hsk_map(hsk_df)
+    annotate_token = hsk_annotator(hsk_map)
+
+    # (Hanzi, ruby, Pinyin) renderings, reused for every repetition of a token
+    rendered: Dict[str, Tuple[str, str, str]] = {}
+
+    out_hanzi: List[str] = []
+    out_ruby: List[str] = []
+    out_pinyin: List[str] = []
+    for tokens in paragraph_tokens:
+        hanzi_pieces: List[str] = []
+        ruby_pieces: List[str] = []
+        words: List[str] = []
+
+        for token in tokens:
             if is_hanzi_word(token):
-                pys = pinyin(token, style=TONE_STYLE, strict=False, errors="ignore")
-                word = "".join(colorize_pinyin(s[0]) for s in pys)
-                if pending_open:
-                    word = pending_open + word
-                    pending_open = ""
-                pieces.append(word)
-                if not (next_is_punct(i, tokens, n_tokens) or i == n_tokens - 1):
-                    pieces.append("\\pywordsep{}")
-
-            elif PUNCT_OPEN_PATTERN.match(token):
-                # opening punct attaches to next token
-                pending_open += token
-
-            elif PUNCT_CLOSE_PATTERN.match(token):
-                # closing punct attaches to previous token
-                if pieces:
-                    pieces[-1] += token
+                views = rendered.get(token)
+                if views is None:
+                    word = annotate_token(token)
+                    syls = colorize_token(token)
+                    views = (f"\\ruby{{{word}}}{{}}", f"\\ruby{{{word}}}{{{syls}}}", syls)
+                    rendered[token] = views
+                hanzi_piece, ruby_piece, syls = views
+                hanzi_pieces.append(hanzi_piece)
+                ruby_pieces.append(ruby_piece)
+                words.append(syls)
+            else:
+                # Latin/number/punctuation/etc.
+                if PUNCT_ANY_PATTERN.match(token):
+                    piece = token
                 else:
-                    pieces.append(token)
-                # no \pywordsep if the next token is punctuation
-                if i != n_tokens - 1 and not next_is_punct(i, tokens, n_tokens):
-                    pieces.append("\\pywordsep{}")
-
-            else:  # Latin/number/etc.
-                word = pending_open + token if pending_open else token
-                pending_open = ""
-                pieces.append(word)
-                if not (next_is_punct(i, tokens, n_tokens) or i == n_tokens - 1):
-                    pieces.append("\\pywordsep{}")
+                    piece = f"\\ruby{{{token}}}{{}}"
+                hanzi_pieces.append(piece)
+                ruby_pieces.append(piece)
+                words.append(token)
 
-        if pending_open:
-            pieces.append(pending_open)
+        out_hanzi.append("".join(hanzi_pieces))
+        out_ruby.append("".join(ruby_pieces))
+        out_pinyin.append(pinyin_paragraph(tokens, words))
 
-        out.append("".join(pieces))
-    return "\n\n".join(out)
+    return "\n\n".join(out_hanzi), "\n\n".join(out_ruby), "\n\n".join(out_pinyin)
 
 
-def vocabulary(text: str, hsk_df: pd.DataFrame = pd.DataFrame()) -> str:
+def vocabulary(
+    text: str,
+    hsk_df: pd.DataFrame = pd.DataFrame(),
+    hsk_map: Optional[Dict[str, Dict[str, Any]]] = None,
+    tokens: Optional[Iterable[str]] = None,
+) -> str:
     """
     Build a LaTeX Vocabulary section from the given Chinese text,
     using HSK data to annotate known words.
+
+    A precomputed `hsk_map` (see `build_hsk_map`) takes precedence over `hsk_df`,
+    and already segmented `tokens` of the text take precedence over `text`.
     """
-    if hsk_df.empty:
+    if hsk_map is None:
+        hsk_map = build_hsk_map(hsk_df)
+    if not hsk_map:
         return ""
-
-    hsk_map = build_hsk_map(hsk_df)
+    if tokens is None:
+        tokens = cut_mixed_batch([text])[0]
 
     vocabulary_hanzi: Dict[str, Set[str]] = defaultdict(set)
-    for token in cut_mixed(text):
+    for token in tokens:
         if not is_hanzi_word(token):
             continue
         if token in hsk_map:
@@ -351,9 +490,6 @@ def vocabulary(text: str, hsk_df: pd.DataFrame = pd.DataFrame()) -> str:
         return ""
 
     parts = []
-    english_col_width = "0.5\\linewidth"
-    colspec = "cccc p{" + english_col_width + "}"
-
     for level in sorted(vocabulary_hanzi.keys()):
         # Pick a sample to get level_display
         level_display = None
@@ -363,38 +499,15 @@ def vocabulary(text: str, hsk_df: pd.DataFrame = pd.DataFrame()) -> str:
         title = level_display if level_display else f"HSK {level}"
 
         parts.append(f"\\subsection*{{{title}}}")
-        parts.append(f"\\begin{{longtable}}{{{colspec}}}")
-        # --- header for first page
-        parts.append("\\hline")
-        parts.append(
-            "\\textbf{Hanzi} & \\textbf{Pinyin} & \\textbf{POS}"
-            " & \\textbf{Audio} & \\textbf{English}\\\\"
-        )
-        parts.append("\\hline")
-        parts.append("\\endfirsthead")
-        # --- header for continuation pages
-        parts.append("\\hline")
-        parts.append(
-            "\\textbf{Hanzi} & \\textbf{Pinyin} & \\textbf{POS}"
-            " & \\textbf{Audio} & \\textbf{English}\\\\"
-        )
-        parts.append("\\hline")
-        parts.append("\\endhead")
-        # --- footer on non-final pages
-        parts.append("\\hline")
-        parts.append("\\multicolumn{5}{r}{\\footnotesize Continued on next page}\\\\")
-        parts.append("\\endfoot")
-        # --- footer on last page
-        parts.append("\\hline")
-        parts.append("\\endlastfoot")
-
+        parts.append(VOCABULARY_TABLE_HEADER)
+        rows = []
         for hanzi in sorted(vocabulary_hanzi[level]):
             entry = hsk_map[hanzi]
-            parts.append(
+            rows.append(
                 f"{hanzi} & {entry['pinyin']} & {entry['pos']}"
-                f" & {entry["audio"]} & {entry['english']}\\\\"
+                f" & {entry['audio']} & {entry['english']}\\\\"
             )
-
+        parts.append("\n".join(rows))
         parts.append("\\end{longtable}")
         parts.append("")  # blank line between subsections
 
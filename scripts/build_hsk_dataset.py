@@ -5,6 +5,7 @@ Usage:
     python build_hsk_dataset.py --out hsk_words.csv
     python build_hsk_dataset.py --levels 1 2 3 --out hsk123.csv
     python build_hsk_dataset.py --levels 4 5 --out hsk45.csv --page-size 200
+    python build_hsk_dataset.py --out hsk_words.csv --workers 4
 
 Output CSV columns:
     level, hanzi, pinyin, english
@@ -14,6 +15,8 @@ import argparse
 import json
 import math
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Dict, List, Optional
 
 import pandas as pd
@@ -24,6 +27,9 @@ from tqdm import tqdm
 
 API_URL = "https://api.hskmock.com/mock/word/searchWords"
 
+# Default number of pages fetched concurrently
+DEFAULT_WORKERS = 8
+
 
 def build_session() -> requests.Session:
     """Create a requests session with retries and default headers."""
@@ -86,9 +92,18 @@ def normalize_item(level: int, item: Dict[str, Any]) -> Dict[str, Any]:
 
 
 def collect_level(
-    level_id: int, session: requests.Session, page_size: int
+    level_id: int,
+    session: requests.Session,
+    page_size: int,
+    workers: int = DEFAULT_WORKERS,
 ) -> List[Dict[str, Any]]:
-    """Download all pages of words for one HSK level."""
+    """Download all pages of words for one HSK level.
+
+    The first page is fetched with `session` to learn the total; the remaining
+    pages are fetched concurrently by up to `workers` threads, keeping page
+    order. requests does not document `Session` as thread-safe, so each worker
+    thread uses its own session.
+    """
     rows: List[Dict[str, Any]] = []
 
     first = fetch_page(session, level_id, page_num=1, page_size=page_size)
@@ -101,9 +116,19 @@ def collect_level(
     for it in first_items:
         rows.append(normalize_item(level_id, it))
 
-    with tqdm(total=pages, initial=1, desc=f"HSK{level_id}", unit="page") as pbar:
-        for page_num in range(2, pages + 1):
-            data = fetch_page(session, level_id, page_num, page_size)
+    worker = threading.local()
+
+    def init_worker() -> None:
+        worker.session = build_session()
+
+    def fetch(page_num: int) -> Dict[str, Any]:
+        return fetch_page(worker.session, level_id, page_num, page_size)
+
+    with (
+        tqdm(total=pages, initial=1, desc=f"HSK{level_id}", unit="page") as pbar,
+        ThreadPoolExecutor(max_workers=workers, initializer=init_worker) as executor,
+    ):
+        for data in executor.map(fetch, range(2, pages + 1)):
             items, _ = extract_items_and_total(data)
             for it in items:
                 rows.append(normalize_item(level_id, it))
@@ -134,7 +159,16 @@ def parse_args():
         default=100,
         help="Number of words per page (default: 100)",
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help=f"Number of pages fetched concurrently (default: {DEFAULT_WORKERS})",
+    )
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    return args
 
 
 def main():
@@ -144,7 +178,7 @@ def main():
     all_rows: List[Dict[str, Any]] = []
 
     for level in args.levels:
-        all_rows.extend(collect_level(level, session, args.page_size))
+        all_rows.extend(collect_level(level, session, args.page_size, args.workers))
 
     if not all_rows:
         print("No data collected. Check token or headers.", file=sys.stderr)
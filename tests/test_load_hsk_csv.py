@@ -0,0 +1,34 @@
+"""
+Parity check between the PyArrow and default HSK CSV load paths.
+"""
+
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "chinese2pdf"))
+
+from main import load_hsk_csv  # noqa: E402
+from text_formatter import build_hsk_map  # noqa: E402
+
+HSK_CSV = (
+    "level,hanzi,pinyin,pinyin_tone,pinyin_num,english,pos,tts_url\n"
+    "1,我们,wǒmen,wǒ men,wo3 men5,we,pron,https://example.com/women.mp3\n"
+    "2,你,,,,you,,\n"
+    "3,好,hǎo,  hǎo ,hao3,good,adj,\n"
+)
+
+
+def test_pyarrow_and_default_loaders_build_same_hsk_map(tmp_path):
+    pytest.importorskip("pyarrow")
+    csv_path = tmp_path / "hsk.csv"
+    csv_path.write_text(HSK_CSV, encoding="utf-8")
+
+    with_pyarrow = build_hsk_map(load_hsk_csv(csv_path))
+    # Fallback used by `load_hsk_csv` when pyarrow is missing
+    without_pyarrow = build_hsk_map(pd.read_csv(csv_path))
+
+    assert with_pyarrow == without_pyarrow
+    assert with_pyarrow["你"]["pinyin"] == ""